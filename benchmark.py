@@ -28,6 +28,7 @@ from normalizer import (
     EnglishNormalizer,
     Normalizer
 )
+from whisper_cpp_adapter import WHISPER_DEVICE
 
 WorkerResult = namedtuple("WorkerResult", ["metric", "num_errors", "num_tokens", "audio_sec", "process_sec"])
 RESULTS_FOLDER = os.path.join(os.path.dirname(__file__), "results")
@@ -57,6 +58,9 @@ def process(
     metrics = {m: Metric.create(m) for m in metric_names}
     results = {m: {"num_errors": 0, "num_tokens": 0} for m in metric_names}
 
+    engine.prepare([dataset.get(index)[0] for index in indices])
+    engine.flush()
+
     for index in indices:
         audio_path, ref_transcript = dataset.get(index)
 
@@ -103,7 +107,8 @@ def main():
     parser.add_argument("--punctuation", action="store_true")
     parser.add_argument("--punctuation-set", type=str, default=".?")
     parser.add_argument("--num-examples", type=int, default=None)
-    parser.add_argument("--num-workers", type=int, default=os.cpu_count())
+    # Every worker loads its own copy of the model, so GPU runs use a single worker unless told otherwise
+    parser.add_argument("--num-workers", type=int, default=os.cpu_count() if WHISPER_DEVICE == "cpu" else 1)
     args = parser.parse_args()
 
     engine_name = Engines(args.engine)
@@ -115,7 +120,8 @@ def main():
     num_examples = args.num_examples
     num_workers = args.num_workers
 
-    engine_params = dict()
+    # Split the cores between the workers so that whisper.cpp instances do not oversubscribe the CPU
+    engine_params = dict(num_threads=max(1, os.cpu_count() // num_workers))
     for p in punctuation_set:
         if p not in SUPPORTED_PUNCTUATION_SET:
             raise ValueError(f"`{p}` is not a supported punctuation character")
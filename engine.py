@@ -5,14 +5,19 @@ import time
 import uuid
 import warnings
 from enum import Enum
+from pathlib import Path
 from threading import Event
 from typing import (
     Any,
     ByteString,
+    Dict,
     Generator,
+    List,
     Optional,
     Sequence,
-    Tuple
+    Set,
+    Tuple,
+    Type
 )
 
 from languages import (
@@ -20,17 +25,56 @@ from languages import (
     Languages
 )
 import soundfile
-from whisper_cpp_adapter import WhisperCppModel
+from faster_whisper_adapter import FasterWhisperModel
+from whisper_cpp_adapter import (
+    WHISPER_DEVICE,
+    WhisperCppModel
+)
 
 warnings.filterwarnings("ignore", message="FP16 is not supported on CPU; using FP32 instead")
 warnings.filterwarnings("ignore", message="Performing inference on CPU when CUDA is available")
 
 NUM_THREADS = 1
-os.environ["OMP_NUM_THREADS"] = str(NUM_THREADS)
-os.environ["MKL_NUM_THREADS"] = str(NUM_THREADS)
+if WHISPER_DEVICE == "cpu":
+    os.environ["OMP_NUM_THREADS"] = str(NUM_THREADS)
+    os.environ["MKL_NUM_THREADS"] = str(NUM_THREADS)
+
+TIMINGS_FOLDER = os.path.join(os.path.dirname(__file__), "timings")
 
 SAMPLE_RATE = 16000
 BYTES_PER_SAMPLE = 2
+BATCH_SIZE = 64
+
+# First line of a transcription cache file, followed by the length of the transcribed audio
+AUDIO_SEC_HEADER = "#audio_sec="
+
+
+def _flac_frames_sr(path: str) -> Optional[Tuple[int, int]]:
+    # Every FLAC file starts with `fLaC` followed by the STREAMINFO block, which holds the sample rate (20 bits) and
+    # the total number of samples (36 bits) in bytes 10 to 17 of its body. Reading them avoids opening a decoder.
+    with open(path, "rb") as f:
+        header = f.read(26)
+    if len(header) < 26 or header[:4] != b"fLaC" or (header[4] & 0x7F) != 0:
+        return None
+
+    x = int.from_bytes(header[18:26], "big")
+    sample_rate = x >> 44
+    frames = x & ((1 << 36) - 1)
+    # A total of zero means the encoder did not know the length
+    if frames == 0:
+        return None
+
+    return frames, sample_rate
+
+
+def _audio_length_sec(path: str) -> float:
+    frames_sr = _flac_frames_sr(path)
+    if frames_sr is None:
+        info = soundfile.info(path)
+        frames_sr = info.frames, info.samplerate
+    frames, sample_rate = frames_sr
+    assert sample_rate == SAMPLE_RATE
+    return frames / sample_rate
 
 
 class Engines(Enum):
@@ -42,9 +86,23 @@ class Engines(Enum):
     WHISPER_LARGE_V2 = "WHISPER_LARGE_V2"
     WHISPER_LARGE_V3 = "WHISPER_LARGE_V3"
     WHISPER_LARGE_V3_TURBO = "WHISPER_LARGE_V3_TURBO"
+    FASTER_WHISPER_TINY = "FASTER_WHISPER_TINY"
+    FASTER_WHISPER_BASE = "FASTER_WHISPER_BASE"
+    FASTER_WHISPER_SMALL = "FASTER_WHISPER_SMALL"
+    FASTER_WHISPER_MEDIUM = "FASTER_WHISPER_MEDIUM"
+    FASTER_WHISPER_LARGE = "FASTER_WHISPER_LARGE"
+    FASTER_WHISPER_LARGE_V2 = "FASTER_WHISPER_LARGE_V2"
+    FASTER_WHISPER_LARGE_V3 = "FASTER_WHISPER_LARGE_V3"
+    FASTER_WHISPER_LARGE_V3_TURBO = "FASTER_WHISPER_LARGE_V3_TURBO"
 
 
 class Engine(object):
+    def prepare(self, paths: Sequence[str]) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
     def transcribe(self, path: str) -> str:
         raise NotImplementedError()
 
@@ -62,24 +120,10 @@ class Engine(object):
 
     @classmethod
     def create(cls, x: Engines, language: Languages, **kwargs):
-        if x is Engines.WHISPER_TINY:
-            return WhisperTiny(language=language)
-        elif x is Engines.WHISPER_BASE:
-            return WhisperBase(language=language)
-        elif x is Engines.WHISPER_SMALL:
-            return WhisperSmall(language=language)
-        elif x is Engines.WHISPER_MEDIUM:
-            return WhisperMedium(language=language)
-        elif x is Engines.WHISPER_LARGE:
-            return WhisperLarge(language=language)
-        elif x is Engines.WHISPER_LARGE_V2:
-            return WhisperLargeV2(language=language)
-        elif x is Engines.WHISPER_LARGE_V3:
-            return WhisperLargeV3(language=language)
-        elif x is Engines.WHISPER_LARGE_V3_TURBO:
-            return WhisperLargeV3Turbo(language=language)
-        else:
+        engine_cls = _ENGINE_FACTORY.get(x)
+        if engine_cls is None:
             raise ValueError(f"Cannot create {cls.__name__} of type `{x}`")
+        return engine_cls(language=language, **kwargs)
 
 
 class Whisper(Engine):
@@ -93,31 +137,96 @@ class Whisper(Engine):
         Languages.PT_BR: "pt",
     }
 
-    def __init__(self, cache_extension: str, model: str, language: Languages):
+    def __init__(self, cache_extension: str, model: str, language: Languages, num_threads: int = NUM_THREADS):
         #self._model = whisper.load_model(model, device="cpu")
-        self._model = WhisperCppModel(model=model)
-        self._cache_extension = cache_extension
+        self._model = self._load_model(model=model, num_threads=num_threads)
+        self._cache_extension = cache_extension + self._model.variant
         self._language_code = self.LANGUAGE_TO_WHISPER_CODE[language]
         self._audio_sec = 0.0
         self._proc_sec = 0.0
+        self._pending: List[str] = []
+        self._cache_files: Dict[str, Set[str]] = dict()
 
-    def transcribe(self, path: str) -> str:
-        info = soundfile.info(path)
-        assert info.samplerate == SAMPLE_RATE
-        self._audio_sec += info.frames / info.samplerate
+        # Every worker process appends its own log, so concurrent workers never write to the same file
+        self._timings_path = os.path.join(TIMINGS_FOLDER, f"{self._cache_extension.lstrip('.')}.{os.getpid()}.jsonl")
+        self._timings_log = None
+
+    @staticmethod
+    def _load_model(model: str, num_threads: int) -> Any:
+        return WhisperCppModel(model=model, num_threads=num_threads)
+
+    def _log_timing(self, paths: Sequence[str], audio_sec: float, proc_sec: float) -> None:
+        if self._timings_log is None:
+            os.makedirs(TIMINGS_FOLDER, exist_ok=True)
+            self._timings_log = open(self._timings_path, "a", buffering=1)
+
+        self._timings_log.write(json.dumps({"paths": list(paths), "audio_sec": audio_sec, "proc_sec": proc_sec}) + "\n")
 
-        cache_path = path.replace(".flac", self._cache_extension)
-        if os.path.exists(cache_path):
-            with open(cache_path) as f:
-                res = f.read()
+    def _cache_path(self, path: str) -> str:
+        return os.path.splitext(path)[0] + self._cache_extension
+
+    def _is_cached(self, cache_path: str) -> bool:
+        folder, filename = os.path.split(cache_path)
+        if folder not in self._cache_files:
+            # One listing per folder instead of a `stat()` per file
+            self._cache_files[folder] = {
+                x.name for x in os.scandir(folder or ".") if x.name.endswith(self._cache_extension)
+            }
+        return filename in self._cache_files[folder]
+
+    def _read_cache(self, cache_path: str, path: str) -> Tuple[float, str]:
+        res = Path(cache_path).read_text(encoding="utf-8")
+        if res.startswith(AUDIO_SEC_HEADER):
+            header, _, res = res.partition("\n")
+            return float(header[len(AUDIO_SEC_HEADER):]), res
+
+        # Caches written before the audio length was stored alongside the transcription
+        return _audio_length_sec(path), res
+
+    def _write_cache(self, cache_path: str, res: str, audio_sec: float) -> None:
+        # Storing the audio length lets cached transcriptions be counted without opening the audio
+        Path(cache_path).write_text(f"{AUDIO_SEC_HEADER}{audio_sec!r}\n{res}", encoding="utf-8")
+
+        folder, filename = os.path.split(cache_path)
+        if folder in self._cache_files:
+            self._cache_files[folder].add(filename)
+
+    def prepare(self, paths: Sequence[str]) -> None:
+        self._pending.extend(p for p in paths if not self._is_cached(self._cache_path(p)))
+
+    def flush(self) -> None:
+        for i in range(0, len(self._pending), BATCH_SIZE):
+            batch = self._pending[i : i + BATCH_SIZE]
+            audio_secs = [_audio_length_sec(path) for path in batch]
+
+            start_sec = time.time()
+            results = self._model.transcribe_batch(batch, language=self._language_code)
+            proc_sec = time.time() - start_sec
+            self._proc_sec += proc_sec
+            self._log_timing(batch, sum(audio_secs), proc_sec)
+
+            for path, audio_sec, res in zip(batch, audio_secs, results):
+                self._write_cache(self._cache_path(path), res["text"], audio_sec)
+
+        self._pending = []
+
+    def transcribe(self, path: str) -> str:
+        cache_path = self._cache_path(path)
+        if self._is_cached(cache_path):
+            audio_sec, res = self._read_cache(cache_path, path)
+            self._audio_sec += audio_sec
             return res
 
+        audio_sec = _audio_length_sec(path)
+        self._audio_sec += audio_sec
+
         start_sec = time.time()
         res = self._model.transcribe(path, language=self._language_code)["text"]
-        self._proc_sec += time.time() - start_sec
+        proc_sec = time.time() - start_sec
+        self._proc_sec += proc_sec
+        self._log_timing([path], audio_sec, proc_sec)
 
-        with open(cache_path, "w") as f:
-            f.write(res)
+        self._write_cache(cache_path, res, audio_sec)
 
         return res
 
@@ -128,78 +237,177 @@ class Whisper(Engine):
         return self._proc_sec
 
     def delete(self) -> None:
-        pass
+        self._model.delete()
+        if self._timings_log is not None:
+            self._timings_log.close()
 
     def __str__(self) -> str:
         raise NotImplementedError()
 
 
 class WhisperTiny(Whisper):
-    def __init__(self, language: Languages):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
         model = "tiny.en" if language == Languages.EN else "tiny"
-        super().__init__(cache_extension=".wspt", model=model, language=language)
+        super().__init__(cache_extension=".wspt", model=model, language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Tiny"
 
 
 class WhisperBase(Whisper):
-    def __init__(self, language: Languages):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
         model = "base.en" if language == Languages.EN else "base"
-        super().__init__(cache_extension=".wspb", model=model, language=language)
+        super().__init__(cache_extension=".wspb", model=model, language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Base"
 
 
 class WhisperSmall(Whisper):
-    def __init__(self, language: Languages):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
         model = "small.en" if language == Languages.EN else "small"
-        super().__init__(cache_extension=".wsps", model=model, language=language)
+        super().__init__(cache_extension=".wsps", model=model, language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Small"
 
 
 class WhisperMedium(Whisper):
-    def __init__(self, language: Languages):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
         model = "medium.en" if language == Languages.EN else "medium"
-        super().__init__(cache_extension=".wspm", model=model, language=language)
+        super().__init__(cache_extension=".wspm", model=model, language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Medium"
 
 
 class WhisperLarge(Whisper):
-    def __init__(self, language: Languages):
-        super().__init__(cache_extension=".wspl", model="large-v1", language=language)
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".wspl", model="large-v1", language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Large-v1"
 
 
 class WhisperLargeV2(Whisper):
-    def __init__(self, language: Languages):
-        super().__init__(cache_extension=".wspl2", model="large-v2", language=language)
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".wspl2", model="large-v2", language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Large-v2"
 
 
 class WhisperLargeV3(Whisper):
-    def __init__(self, language: Languages):
-        super().__init__(cache_extension=".wspl3", model="large-v3", language=language)
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".wspl3", model="large-v3", language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Large-v3"
     
 class WhisperLargeV3Turbo(Whisper):
-    def __init__(self, language: Languages):
-        super().__init__(cache_extension=".wspl3t", model="large-v3-turbo", language=language)
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".wspl3t", model="large-v3-turbo", language=language, num_threads=num_threads)
 
     def __str__(self) -> str:
         return "Whisper Large-v3-turbo"
 
+
+class FasterWhisper(Whisper):
+    @staticmethod
+    def _load_model(model: str, num_threads: int) -> Any:
+        return FasterWhisperModel(model=model, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        raise NotImplementedError()
+
+
+class FasterWhisperTiny(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        model = "tiny.en" if language == Languages.EN else "tiny"
+        super().__init__(cache_extension=".fwspt", model=model, language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Tiny"
+
+
+class FasterWhisperBase(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        model = "base.en" if language == Languages.EN else "base"
+        super().__init__(cache_extension=".fwspb", model=model, language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Base"
+
+
+class FasterWhisperSmall(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        model = "small.en" if language == Languages.EN else "small"
+        super().__init__(cache_extension=".fwsps", model=model, language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Small"
+
+
+class FasterWhisperMedium(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        model = "medium.en" if language == Languages.EN else "medium"
+        super().__init__(cache_extension=".fwspm", model=model, language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Medium"
+
+
+class FasterWhisperLarge(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".fwspl", model="large-v1", language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Large-v1"
+
+
+class FasterWhisperLargeV2(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".fwspl2", model="large-v2", language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Large-v2"
+
+
+class FasterWhisperLargeV3(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".fwspl3", model="large-v3", language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Large-v3"
+
+
+class FasterWhisperLargeV3Turbo(FasterWhisper):
+    def __init__(self, language: Languages, num_threads: int = NUM_THREADS):
+        super().__init__(cache_extension=".fwspl3t", model="large-v3-turbo", language=language, num_threads=num_threads)
+
+    def __str__(self) -> str:
+        return "Faster-Whisper Large-v3-turbo"
+
+
+_ENGINE_FACTORY: Dict[Engines, Type[Engine]] = {
+    Engines.WHISPER_TINY: WhisperTiny,
+    Engines.WHISPER_BASE: WhisperBase,
+    Engines.WHISPER_SMALL: WhisperSmall,
+    Engines.WHISPER_MEDIUM: WhisperMedium,
+    Engines.WHISPER_LARGE: WhisperLarge,
+    Engines.WHISPER_LARGE_V2: WhisperLargeV2,
+    Engines.WHISPER_LARGE_V3: WhisperLargeV3,
+    Engines.WHISPER_LARGE_V3_TURBO: WhisperLargeV3Turbo,
+    Engines.FASTER_WHISPER_TINY: FasterWhisperTiny,
+    Engines.FASTER_WHISPER_BASE: FasterWhisperBase,
+    Engines.FASTER_WHISPER_SMALL: FasterWhisperSmall,
+    Engines.FASTER_WHISPER_MEDIUM: FasterWhisperMedium,
+    Engines.FASTER_WHISPER_LARGE: FasterWhisperLarge,
+    Engines.FASTER_WHISPER_LARGE_V2: FasterWhisperLargeV2,
+    Engines.FASTER_WHISPER_LARGE_V3: FasterWhisperLargeV3,
+    Engines.FASTER_WHISPER_LARGE_V3_TURBO: FasterWhisperLargeV3Turbo,
+}
+
 __all__ = [
     "Engine",
     "Engines",
@@ -0,0 +1,36 @@
+import os
+
+# CTranslate2 runs on CPU or CUDA only, so any other `WHISPER_DEVICE` falls back to the CPU
+DEVICE = "cuda" if os.getenv("WHISPER_DEVICE") == "cuda" else "cpu"
+
+# int8 weights use the VNNI/dot-product GEMM kernels on CPU; on GPU, activations stay in float16
+DEVICE_TO_COMPUTE_TYPE = {
+    "cpu": "int8",
+    "cuda": "int8_float16",
+}
+
+
+class FasterWhisperModel:
+    def __init__(self, model: str, num_threads: int):
+        # Imported here so that `engine` (and with it `results` and `plot_results`) loads without faster-whisper
+        from faster_whisper import WhisperModel
+
+        self.model = model
+        self.variant = ""
+        self._model = WhisperModel(
+            model,
+            device=DEVICE,
+            compute_type=DEVICE_TO_COMPUTE_TYPE[DEVICE],
+            cpu_threads=num_threads,
+        )
+
+    def transcribe(self, audio_path: str, language: str) -> dict[str, str]:
+        segments, _ = self._model.transcribe(audio_path, language=language, without_timestamps=True)
+        return {"text": "".join(segment.text for segment in segments).strip()}
+
+    def transcribe_batch(self, audio_paths: list[str], language: str) -> list[dict[str, str]]:
+        # The model stays loaded between calls, so there is no start-up cost to amortize across files
+        return [self.transcribe(audio_path, language) for audio_path in audio_paths]
+
+    def delete(self) -> None:
+        pass
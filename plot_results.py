@@ -1,9 +1,7 @@
 import argparse
+import functools
 import os
-from typing import (
-    Dict,
-    Tuple
-)
+from typing import Optional, Tuple
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -16,11 +14,14 @@ from engine import (
 )
 from results import (
     RTF,
-    WER_DE, WER_EN, WER_ES, WER_FR, WER_IT, WER_PT, PER_DE, PER_EN, PER_ES, PER_FR, PER_IT, PER_PT
+    ErrorRateTable,
+    WER_DE_TABLE, WER_EN_TABLE, WER_ES_TABLE, WER_FR_TABLE, WER_IT_TABLE, WER_PT_TABLE,
+    PER_DE_TABLE, PER_EN_TABLE, PER_ES_TABLE, PER_FR_TABLE, PER_IT_TABLE, PER_PT_TABLE,
 )
 Color = Tuple[float, float, float]
 
 
+@functools.cache
 def rgb_from_hex(x: str) -> Color:
     x = x.strip("# ")
     assert len(x) == 6
@@ -54,26 +55,30 @@ ENGINE_COLORS = {
 
 
 def _plot_error_rate(
-    engine_error_rate: Dict[Engines, Dict[Datasets, float]],
+    ax: Optional[plt.Axes],
+    table: ErrorRateTable,
     save_path: str,
     streaming: bool,
     show: bool = False,
     punctuation: bool = False,
 ) -> None:
-    sorted_error_rates = sorted(
-        [
-            (e, round(sum(w for w in engine_error_rate[e].values()) / len(engine_error_rate[e]) + 1e-9, 1))
-            for e in engine_error_rate.keys()
-        ],
-        key=lambda x: x[1],
-    )
-    print("\n".join(f"{e.value}: {x}" for e, x in sorted_error_rates))
+    mean_error_rates = np.round(table.error_rates.mean(axis=1) + 1e-9, 1)
 
-    _, ax = plt.subplots(figsize=(12, 6))
+    order = np.argsort(mean_error_rates, kind="stable")
+    sorted_engines = [table.engines[i] for i in order]
+    sorted_error_rates = mean_error_rates[order]
+    print("\n".join(f"{e.value}: {x}" for e, x in zip(sorted_engines, sorted_error_rates)))
+
+    # Without a shared axes (i.e. with `--show`), every plot gets its own figure so that each one is displayed
+    if ax is None:
+        _, ax = plt.subplots(figsize=(12, 6))
+    else:
+        ax.clear()
 
-    for i, (engine, error_rate) in enumerate(sorted_error_rates, start=1):
-        color = ENGINE_COLORS[engine]
-        ax.bar([i], [error_rate], 0.4, color=color)
+    positions = np.arange(1, len(sorted_engines) + 1)
+    colors = [ENGINE_COLORS[e] for e in sorted_engines]
+    ax.bar(positions, sorted_error_rates, 0.4, color=colors)
+    for i, error_rate, color in zip(positions, sorted_error_rates, colors):
         ax.text(
             i,
             error_rate + 0.5,
@@ -83,29 +88,27 @@ def _plot_error_rate(
             va="bottom",
         )
 
-    for spine in plt.gca().spines.values():
+    for spine in ax.spines.values():
         if spine.spine_type != "bottom" and spine.spine_type != "left":
             spine.set_visible(False)
 
-    plt.xticks(
-        np.arange(1, len(sorted_error_rates) + 1),
-        [ENGINE_PRINT_NAMES[x[0]] for x in sorted_error_rates],
+    ax.set_xticks(
+        positions,
+        [ENGINE_PRINT_NAMES[e] for e in sorted_engines],
         fontsize=8,
     )
     ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, p: f"{x:.0f}%"))
     if punctuation:
-        plt.ylabel("Punctuation Error Rate (lower is better)")
+        ax.set_ylabel("Punctuation Error Rate (lower is better)")
     else:
-        plt.ylabel("Word Error Rate (lower is better)")
+        ax.set_ylabel("Word Error Rate (lower is better)")
 
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-    plt.savefig(save_path)
+    ax.figure.savefig(save_path)
     print(f"Saved plot to `{save_path}`")
 
     if show:
         plt.show()
-
-    plt.close()
+        plt.close(ax.figure)
 
 
 def _plot_cpu(save_folder: str, show: bool, dataset: Datasets = Datasets.TED_LIUM) -> None:
@@ -158,21 +161,32 @@ def main() -> None:
     parser.add_argument("--show", action="store_true")
     args = parser.parse_args()
 
-    save_folder = os.path.join(RESULTS_FOLDER, "plots")
+    # Without `--show` the plots are only saved, so use the non-interactive backend
+    if not args.show:
+        plt.switch_backend("Agg")
 
-    _plot_error_rate(WER_EN, save_path=os.path.join(save_folder, "WER.png"), streaming=False, show=args.show)
-    _plot_error_rate(WER_FR, save_path=os.path.join(save_folder, "WER_FR.png"), streaming=False, show=args.show)
-    _plot_error_rate(WER_DE, save_path=os.path.join(save_folder, "WER_DE.png"), streaming=False, show=args.show)
-    _plot_error_rate(WER_ES, save_path=os.path.join(save_folder, "WER_ES.png"), streaming=False, show=args.show)
-    _plot_error_rate(WER_IT, save_path=os.path.join(save_folder, "WER_IT.png"), streaming=False, show=args.show)
-    _plot_error_rate(WER_PT, save_path=os.path.join(save_folder, "WER_PT.png"), streaming=False, show=args.show)
-
-    _plot_error_rate(PER_EN, save_path=os.path.join(save_folder, "PER_ST.png"), streaming=True, punctuation=True, show=args.show)
-    _plot_error_rate(PER_FR, save_path=os.path.join(save_folder, "PER_FR_ST.png"), streaming=True, punctuation=True, show=args.show)
-    _plot_error_rate(PER_DE, save_path=os.path.join(save_folder, "PER_DE_ST.png"), streaming=True, punctuation=True, show=args.show)
-    _plot_error_rate(PER_ES, save_path=os.path.join(save_folder, "PER_ES_ST.png"), streaming=True, punctuation=True, show=args.show)
-    _plot_error_rate(PER_IT, save_path=os.path.join(save_folder, "PER_IT_ST.png"), streaming=True, punctuation=True, show=args.show)
-    _plot_error_rate(PER_PT, save_path=os.path.join(save_folder, "PER_PT_ST.png"), streaming=True, punctuation=True, show=args.show)
+    save_folder = os.path.join(RESULTS_FOLDER, "plots")
+    os.makedirs(save_folder, exist_ok=True)
+
+    # When only saving, all error rate plots share one figure, which is cleared between plots
+    fig, ax = (None, None) if args.show else plt.subplots(figsize=(12, 6))
+
+    _plot_error_rate(ax, WER_EN_TABLE, save_path=os.path.join(save_folder, "WER.png"), streaming=False, show=args.show)
+    _plot_error_rate(ax, WER_FR_TABLE, save_path=os.path.join(save_folder, "WER_FR.png"), streaming=False, show=args.show)
+    _plot_error_rate(ax, WER_DE_TABLE, save_path=os.path.join(save_folder, "WER_DE.png"), streaming=False, show=args.show)
+    _plot_error_rate(ax, WER_ES_TABLE, save_path=os.path.join(save_folder, "WER_ES.png"), streaming=False, show=args.show)
+    _plot_error_rate(ax, WER_IT_TABLE, save_path=os.path.join(save_folder, "WER_IT.png"), streaming=False, show=args.show)
+    _plot_error_rate(ax, WER_PT_TABLE, save_path=os.path.join(save_folder, "WER_PT.png"), streaming=False, show=args.show)
+
+    _plot_error_rate(ax, PER_EN_TABLE, save_path=os.path.join(save_folder, "PER_ST.png"), streaming=True, punctuation=True, show=args.show)
+    _plot_error_rate(ax, PER_FR_TABLE, save_path=os.path.join(save_folder, "PER_FR_ST.png"), streaming=True, punctuation=True, show=args.show)
+    _plot_error_rate(ax, PER_DE_TABLE, save_path=os.path.join(save_folder, "PER_DE_ST.png"), streaming=True, punctuation=True, show=args.show)
+    _plot_error_rate(ax, PER_ES_TABLE, save_path=os.path.join(save_folder, "PER_ES_ST.png"), streaming=True, punctuation=True, show=args.show)
+    _plot_error_rate(ax, PER_IT_TABLE, save_path=os.path.join(save_folder, "PER_IT_ST.png"), streaming=True, punctuation=True, show=args.show)
+    _plot_error_rate(ax, PER_PT_TABLE, save_path=os.path.join(save_folder, "PER_PT_ST.png"), streaming=True, punctuation=True, show=args.show)
+
+    if fig is not None:
+        plt.close(fig)
 
 if __name__ == "__main__":
     main()
@@ -1,6 +1,14 @@
+from collections import namedtuple
+from typing import Dict
+
+import numpy as np
+
 from dataset import Datasets
 from engine import Engines
 
+# Column layout of an error rate dict: `error_rates[i, j]` is the error rate of `engines[i]` on `datasets[j]`
+ErrorRateTable = namedtuple("ErrorRateTable", ["engines", "datasets", "error_rates"])
+
 RTF = {
     Engines.WHISPER_TINY: {
         Datasets.TED_LIUM: 0.158,
@@ -349,19 +357,55 @@ PER_PT = {
 }
 
 
+def error_rate_table(engine_error_rate: Dict[Engines, Dict[Datasets, float]]) -> ErrorRateTable:
+    engines = list(engine_error_rate.keys())
+    datasets = list(engine_error_rate[engines[0]].keys())
+    error_rates = np.array([[engine_error_rate[e][d] for d in datasets] for e in engines])
+    return ErrorRateTable(engines=engines, datasets=datasets, error_rates=error_rates)
+
+
+WER_EN_TABLE = error_rate_table(WER_EN)
+WER_FR_TABLE = error_rate_table(WER_FR)
+WER_ES_TABLE = error_rate_table(WER_ES)
+WER_DE_TABLE = error_rate_table(WER_DE)
+WER_IT_TABLE = error_rate_table(WER_IT)
+WER_PT_TABLE = error_rate_table(WER_PT)
+
+PER_EN_TABLE = error_rate_table(PER_EN)
+PER_FR_TABLE = error_rate_table(PER_FR)
+PER_ES_TABLE = error_rate_table(PER_ES)
+PER_DE_TABLE = error_rate_table(PER_DE)
+PER_IT_TABLE = error_rate_table(PER_IT)
+PER_PT_TABLE = error_rate_table(PER_PT)
+
+
 __all__ = [
+    "ErrorRateTable",
     "PER_DE",
+    "PER_DE_TABLE",
     "PER_EN",
+    "PER_EN_TABLE",
     "PER_ES",
+    "PER_ES_TABLE",
     "PER_FR",
+    "PER_FR_TABLE",
     "PER_IT",
+    "PER_IT_TABLE",
     "PER_PT",
+    "PER_PT_TABLE",
     "RTF",
     "WER_DE",
+    "WER_DE_TABLE",
     "WER_EN",
+    "WER_EN_TABLE",
     "WER_ES",
+    "WER_ES_TABLE",
     "WER_FR",
+    "WER_FR_TABLE",
     "WER_IT",
+    "WER_IT_TABLE",
     "WER_PT",
+    "WER_PT_TABLE",
+    "error_rate_table",
 ]
 
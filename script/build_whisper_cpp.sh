@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+# Usage: script/build_whisper_cpp.sh [WHISPER_CPP_FOLDER] [EXTRA_CMAKE_ARGS...]
+WHISPER_CPP_FOLDER="${1:-whisper.cpp}"
+shift || true
+
+if [ ! -d "${WHISPER_CPP_FOLDER}" ]; then
+    git clone https://github.com/ggml-org/whisper.cpp.git "${WHISPER_CPP_FOLDER}"
+fi
+
+# `GGML_NATIVE` compiles for the host CPU (`-march=native`), enabling AVX-512, VNNI and F16C wherever
+# the machine supports them. OpenBLAS is used for the large encoder matrix multiplications.
+cmake -S "${WHISPER_CPP_FOLDER}" -B "${WHISPER_CPP_FOLDER}/build" \
+    -DCMAKE_BUILD_TYPE=Release \
+    -DGGML_NATIVE=ON \
+    -DGGML_BLAS=ON \
+    -DGGML_BLAS_VENDOR=OpenBLAS \
+    "$@"
+cmake --build "${WHISPER_CPP_FOLDER}/build" --config Release -j
+
+echo "Set WHISPER_CLI=$(realpath "${WHISPER_CPP_FOLDER}/build/bin/whisper-cli") to benchmark this build"
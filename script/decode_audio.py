@@ -0,0 +1,37 @@
+import argparse
+import os
+
+import soundfile
+
+from whisper_cpp_adapter import decoded_path
+
+
+def decode_folder(folder: str) -> None:
+    num_decoded = 0
+    for root, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if not filename.endswith(".flac"):
+                continue
+
+            flac_path = os.path.join(root, filename)
+            wav_path = decoded_path(flac_path)
+            if os.path.exists(wav_path):
+                continue
+
+            data, sample_rate = soundfile.read(flac_path, dtype="int16")
+            soundfile.write(wav_path, data, sample_rate, subtype="PCM_16")
+            num_decoded += 1
+
+    print(f"Decoded {num_decoded} files in `{folder}`")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset-folder", required=True)
+    args = parser.parse_args()
+
+    decode_folder(args.dataset_folder)
+
+
+if __name__ == "__main__":
+    main()